@@ -1,13 +1,45 @@
 # base.py
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+import pdfplumber
 import pandas as pd
 from validators import InvoiceData, LineItem
 
+def _extract_one(job):
+    """Worker for extract_many - module level so it can be pickled"""
+    extractor_class, pdf_path = job
+    return extractor_class(pdf_path).extract()
+
+
 class BaseExtractor(ABC):
     """Abstract base class for all invoice extractors"""
     
-    def __init__(self, pdf_path: str):
+    def __init__(self, pdf_path: str, pdf=None, text=None):
         self.pdf_path = pdf_path
+        # A PDF handed in by the caller is reused as is and left for them to close
+        self._owns_pdf = pdf is None
+        if pdf is not None:
+            self._pdf = pdf
+        # Full page text the caller already extracted (e.g. for brand detection)
+        if text is not None:
+            self._full_text = text
+    
+    @cached_property
+    def _pdf(self):
+        """PDF opened once and shared by header and line-item extraction"""
+        return pdfplumber.open(self.pdf_path)
+    
+    @cached_property
+    def _full_text(self):
+        """Text of all pages, joined by newlines"""
+        return "\n".join(page.extract_text() or "" for page in self._pdf.pages)
+    
+    def close(self):
+        """Close the shared PDF if this extractor opened it"""
+        pdf = self.__dict__.pop("_pdf", None)
+        if pdf is not None and self._owns_pdf:
+            pdf.close()
     
     @abstractmethod
     def extract_header(self) -> InvoiceData:
@@ -19,15 +51,27 @@ class BaseExtractor(ABC):
         """Extract line items"""
         pass
     
-    def extract(self) -> tuple:
-        """Main extraction method - returns (header_data, line_items_df)"""
+    def extract(self, log=print) -> tuple:
+        """Main extraction method - returns (header_data, line_items_df); errors go to log"""
         try:
             header = self.extract_header()
             items = self.extract_line_items()
             return header.dict(), items
         except Exception as e:
-            print(f"Error: {str(e)}")
+            log(f"Error: {str(e)}")
             return {}, pd.DataFrame()
+        finally:
+            self.close()
+    
+    @classmethod
+    def extract_many(cls, pdf_paths, max_workers=None, chunksize=4) -> list:
+        """Extract several PDFs of this brand in parallel processes.
+
+        Returns one (header_data, line_items_df) tuple per path, in order.
+        """
+        jobs = [(cls, path) for path in pdf_paths]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_extract_one, jobs, chunksize=chunksize))
 
 
 # Now create subclasses for each brand
@@ -35,87 +79,96 @@ class BaseExtractor(ABC):
 from extractors_amazon import extract_with_rules_amazon, extract_cluster_text_amazon, extract_totals_amazon, extract_item_table_amazon
 from extractors_flipkart import extract_cluster_text, extract_fields, extract_line_items as extract_line_items_flipkart
 from extractors_zomato import extract_with_rules_zomato, extract_table_and_totals
-from extractors_blinkit import extract_header as extract_header_blinkit, extract_items_and_totals as extract_items_and_totals_blinkit
+from extractors_blinkit import load_table as load_table_blinkit, extract_header as extract_header_blinkit, extract_items_and_totals as extract_items_and_totals_blinkit
 from extractors_instamart import extract_header as extract_header_instamart, extract_items_and_totals as extract_items_and_totals_instamart
-import pdfplumber
 
 class AmazonExtractor(BaseExtractor):
     """Amazon invoice extractor"""
     
     def extract_header(self) -> InvoiceData:
-        cluster_text = extract_cluster_text_amazon(self.pdf_path)
+        cluster_text = extract_cluster_text_amazon(self._pdf)
         data = extract_with_rules_amazon(cluster_text)
-        tax, total = extract_totals_amazon(self.pdf_path)
+        tax, total = extract_totals_amazon(self._pdf)
         data["total_tax"] = tax
         data["total_amount"] = total
         return InvoiceData(**data)
     
     def extract_line_items(self) -> pd.DataFrame:
-        return extract_item_table_amazon(self.pdf_path)
+        return extract_item_table_amazon(self._pdf)
 
 
 class FlipkartExtractor(BaseExtractor):
     """Flipkart invoice extractor"""
     
     def extract_header(self) -> InvoiceData:
-        cluster_text = extract_cluster_text(self.pdf_path)
+        cluster_text = extract_cluster_text(self._pdf)
         data = extract_fields(cluster_text)
         return InvoiceData(**data)
     
     def extract_line_items(self) -> pd.DataFrame:
-        return extract_line_items_flipkart(self.pdf_path)
+        return extract_line_items_flipkart(self._pdf)
 
 
 class ZomatoExtractor(BaseExtractor):
     """Zomato invoice extractor"""
     
+    @cached_property
+    def _table_and_totals(self):
+        """(line_df, net, tax, total), computed once for header and line items"""
+        return extract_table_and_totals(self._pdf, self._full_text)
+    
     def extract_header(self) -> InvoiceData:
-        with pdfplumber.open(self.pdf_path) as pdf:
-            full_text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-        data = extract_with_rules_zomato(full_text)
-        line_df, net_amt, tax_amt, total_amt = extract_table_and_totals(self.pdf_path)
+        data = extract_with_rules_zomato(self._full_text)
+        line_df, net_amt, tax_amt, total_amt = self._table_and_totals
         data["total_tax"] = tax_amt
         data["total_amount"] = total_amt
         return InvoiceData(**data)
     
     def extract_line_items(self) -> pd.DataFrame:
-        line_df, _, _, _ = extract_table_and_totals(self.pdf_path)
+        line_df, _, _, _ = self._table_and_totals
         return line_df
 
 
 class BlinkitExtractor(BaseExtractor):
     """Blinkit invoice extractor"""
     
+    @cached_property
+    def _table(self):
+        """Main invoice table, extracted once"""
+        return load_table_blinkit(self._pdf)
+    
+    @cached_property
+    def _items_and_totals(self):
+        """(items_df, tax, total), computed once for header and line items"""
+        return extract_items_and_totals_blinkit(self._table)
+    
     def extract_header(self) -> InvoiceData:
-        with pdfplumber.open(self.pdf_path) as pdf:
-            page = pdf.pages[0]
-            table = page.extract_tables()[0]
-            df = pd.DataFrame(table)
-        data = extract_header_blinkit(df)
-        items_df, tax, total = extract_items_and_totals_blinkit(df)
+        data = extract_header_blinkit(self._table)
+        items_df, tax, total = self._items_and_totals
         data["total_tax"] = tax
         data["total_amount"] = total
         return InvoiceData(**data)
     
     def extract_line_items(self) -> pd.DataFrame:
-        with pdfplumber.open(self.pdf_path) as pdf:
-            page = pdf.pages[0]
-            table = page.extract_tables()[0]
-            df = pd.DataFrame(table)
-        items_df, _, _ = extract_items_and_totals_blinkit(df)
+        items_df, _, _ = self._items_and_totals
         return items_df
 
 
 class InstamartExtractor(BaseExtractor):
     """Instamart invoice extractor"""
     
+    @cached_property
+    def _items_and_totals(self):
+        """(item_df, total_tax, total_amount), computed once for header and line items"""
+        return extract_items_and_totals_instamart(self._pdf)
+    
     def extract_header(self) -> InvoiceData:
-        header_data = extract_header_instamart(self.pdf_path)
-        item_df, total_tax, total_amount = extract_items_and_totals_instamart(self.pdf_path)
+        header_data = extract_header_instamart(self._pdf)
+        item_df, total_tax, total_amount = self._items_and_totals
         header_data["total_tax"] = total_tax
         header_data["total_amount"] = total_amount
         return InvoiceData(**header_data)
     
     def extract_line_items(self) -> pd.DataFrame:
-        item_df, _, _ = extract_items_and_totals_instamart(self.pdf_path)
+        item_df, _, _ = self._items_and_totals
         return item_df
@@ -0,0 +1,55 @@
+"""
+Character grouping used by the cluster-text extractors.
+
+DBSCAN with min_samples=1 has no noise points and no density threshold:
+every point is a core point, so the clusters are simply the connected
+components of the "within eps" graph. Bucketing points into an eps-sized
+grid lets each point compare against its 3x3 neighbourhood only.
+"""
+
+import math
+
+
+def cluster_points(points, eps):
+    """Label points like DBSCAN(eps=eps, min_samples=1).fit_predict(points)"""
+    pts = [(float(x), float(y)) for x, y in points]
+    keys = [(math.floor(x / eps), math.floor(y / eps)) for x, y in pts]
+
+    cells = {}
+    for i, key in enumerate(keys):
+        cells.setdefault(key, set()).add(i)
+
+    eps2 = eps * eps
+    labels = [-1] * len(pts)
+    label = 0
+
+    for start in range(len(pts)):
+        if labels[start] != -1:
+            continue
+
+        labels[start] = label
+        cells[keys[start]].discard(start)
+        stack = [start]
+
+        while stack:
+            i = stack.pop()
+            x, y = pts[i]
+            cx, cy = keys[i]
+
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    cell = cells.get((cx + dx, cy + dy))
+                    if not cell:
+                        continue
+                    hits = [
+                        j for j in cell
+                        if (pts[j][0] - x) ** 2 + (pts[j][1] - y) ** 2 <= eps2
+                    ]
+                    for j in hits:
+                        labels[j] = label
+                        cell.discard(j)
+                        stack.append(j)
+
+        label += 1
+
+    return labels
@@ -3,72 +3,107 @@ AMAZON INVOICE EXTRACTOR - FIXED VERSION
 Simple regex extraction with proper field boundaries
 """
 
-import os
 import re
-import pdfplumber
+from pdf_utils import cache_per_file, open_pdf
 import pandas as pd
 import numpy as np
-from sklearn.cluster import DBSCAN
+from clustering import cluster_points
 
 
-def extract_totals_amazon(pdf_path):
-    """Extract tax and total amount from Amazon invoice"""
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
+# =====================================================
+# PRECOMPILED PATTERNS
+# =====================================================
+
+_DATE = r"\d{2}[./-]\d{2}[./-]\d{4}"
+
+_NUM_RE = re.compile(r"[\d.]+")
+_ORDER_NUM_RE = re.compile(r"Order (Number|Id)[:\s]*([\w\-]+)", re.I)
+_INVOICE_NUM_RE = re.compile(r"Invoice (No|Number)[:\s]*([\w\-]+)", re.I)
+_ORDER_DATE_RE = re.compile(r"Order Date[:\s]*(" + _DATE + ")", re.I)
+_INVOICE_DATE_RE = re.compile(r"Invoice Date[:\s]*(" + _DATE + ")", re.I)
+_INV_DETAILS_RE = re.compile(r"Invoice Details[:\s]{0,4}(.{1,200}?)(?=Invoice Date|Order Date|Sl\.)", re.I)
+_BILL_ADDR_RE = re.compile(r"Billing Address[:\s]{0,4}([\s\S]{0,400}?\d{6})", re.I | re.S)
+_SHIP_ADDR_RE = re.compile(r"Shipping Address[:\s]{0,4}([\s\S]{0,400}?\d{6})", re.I | re.S)
+_SELLER_NAME_RE = re.compile(r"Sold By[:\s]*([^,\n]+)", re.I)
+_SELLER_ADDR_RE = re.compile(r"Sold By[:\s]{0,4}(.{1,400}?)(?=PAN No|GST Registration|Billing Address)", re.I | re.S)
+_GST_RE = re.compile(r"GST Registration No[:\s]*(\d{2}[A-Z]{5}\d{4}[A-Z][1-9A-Z]Z[0-9A-Z])", re.I)
+_PAN_RE = re.compile(r"PAN No[:\s]*([A-Z]{5}\d{4}[A-Z])", re.I)
+_STATE_CODE_RE = re.compile(r"State/UT Code[:\s]*(\d{1,2})", re.I)
+_PLACE_RE = re.compile(r"Place of (?:supply|delivery)[:\s]*([A-Z\s]+?)(?=Place of|Invoice|$)", re.I)
+_AMT_WORDS_RE = re.compile(r"Amount in Words[:\s]*(.+?)(?=Net|Tax|Whether|$)", re.I)
+
+# The lazy address/seller/details captures above are bounded (no address
+# runs past ~400 chars) so a missing pin code or stop word fails fast
+# instead of backtracking over the whole cluster text.
+
+
+@cache_per_file()
+def extract_totals_amazon(pdf_or_path):
+    """Extract tax and total amount from Amazon invoice.
+
+    Pages are scanned last-first since the totals row sits at the end.
+    """
+    with open_pdf(pdf_or_path) as pdf:
+        for page in reversed(pdf.pages):
             tables = page.extract_tables()
             if not tables:
                 continue
             table = max(tables, key=len)
-            max_cols = max(len([c for c in row if c]) for row in table)
+            max_cols = max(sum(1 for c in row if c) for row in table)
 
             if max_cols < 6:
                 continue
             df = pd.DataFrame(table).dropna(how="all").reset_index(drop=True)
-            header = df.iloc[0].astype(str)
+            header = [str(c).lower() for c in df.iloc[0]]
             data = df.iloc[1:].reset_index(drop=True)
 
             tax_col, total_col = None, None
-            for idx, col in enumerate(header):
-                c = col.lower()
-                if "tax" in c and "amount" in c:
+            for idx, c in enumerate(header):
+                if "amount" not in c:
+                    continue
+                if "tax" in c:
                     tax_col = idx
-                if "total" in c and "amount" in c:
+                if "total" in c:
                     total_col = idx
 
             if tax_col is None or total_col is None:
-                return 0.0, 0.0
+                continue
 
-            for _, row in data.iterrows():
-                if any("total" in str(cell).lower() for cell in row):
-                    tax_val = re.findall(r"[\d.]+", str(row[tax_col]))
-                    amt_val = re.findall(r"[\d.]+", str(row[total_col]))
-                    return (
-                        float(tax_val[0]) if tax_val else 0.0,
-                        float(amt_val[0]) if amt_val else 0.0,
-                    )
+            mask = data.astype(str).apply(
+                lambda s: s.str.contains("total", case=False, na=False, regex=False)
+            ).any(axis=1)
+            hits = np.flatnonzero(mask.to_numpy())
+            if hits.size:
+                row = data.iloc[hits[0]]
+                tax_val = _NUM_RE.search(str(row.iloc[tax_col]))
+                amt_val = _NUM_RE.search(str(row.iloc[total_col]))
+                return (
+                    float(tax_val.group()) if tax_val else 0.0,
+                    float(amt_val.group()) if amt_val else 0.0,
+                )
 
     return 0.0, 0.0
 
 
-def extract_cluster_text_amazon(pdf_path):
-    """Extract clustered text from Amazon invoice using DBSCAN"""
+@cache_per_file()
+def extract_cluster_text_amazon(pdf_or_path):
+    """Extract clustered text from Amazon invoice by grouping nearby characters"""
     blocks = []
-    with pdfplumber.open(pdf_path) as pdf:
+    with open_pdf(pdf_or_path) as pdf:
         for page in pdf.pages:
             chars = page.chars
             if not chars:
                 continue
 
-            points, refs = [], []
-            for ch in chars:
-                x = (ch["x0"] + ch["x1"]) / 2
-                y = (ch["top"] + ch["bottom"]) / 2
-                points.append([x, y])
-                refs.append(ch)
-
-            points = np.array(points)
+            refs = chars
+            a = np.fromiter(
+                (v for ch in chars for v in (ch["x0"], ch["x1"], ch["top"], ch["bottom"])),
+                dtype=np.float64,
+                count=4 * len(chars),
+            ).reshape(-1, 4)
+            points = np.column_stack(((a[:, 0] + a[:, 1]) / 2, (a[:, 2] + a[:, 3]) / 2))
             points = (points - points.mean(axis=0)) / points.std(axis=0)
-            labels = DBSCAN(eps=0.1, min_samples=1).fit_predict(points)
+            labels = cluster_points(points, eps=0.1)
 
             clusters = {}
             for lbl, ch in zip(labels, refs):
@@ -77,23 +112,31 @@ def extract_cluster_text_amazon(pdf_path):
 
             for group in clusters.values():
                 group = sorted(group, key=lambda c: (c["top"], c["x0"]))
-                text, prev_top = "", None
+                parts, prev_top = [], None
                 for ch in group:
                     if prev_top is not None and abs(ch["top"] - prev_top) > 3:
-                        text += " "
-                    text += ch["text"]
+                        parts.append(" ")
+                    parts.append(ch["text"])
                     prev_top = ch["top"]
-                if len(text.strip()) > 30:
-                    blocks.append(text.strip())
+                text = "".join(parts).strip()
+                if len(text) > 30:
+                    blocks.append(text)
 
     return " | ".join(blocks)
 
 
 def extract_with_rules_amazon(cluster_text):
     """Extract fields using SIMPLE REGEX"""
-    text = re.sub(r'\s+', ' ', cluster_text.replace('|', ' ')).strip()
+    # Whitespace is collapsed once here; captures below only need strip()
+    text = ' '.join(cluster_text.replace('|', ' ').split())
     text_lower = text.lower()
     
+    def search(rx, *anchors):
+        """rx.search(text), skipped when none of the lowercase anchors occur"""
+        if not any(a in text_lower for a in anchors):
+            return None
+        return rx.search(text)
+    
     data = {}
     
     # =====================================================
@@ -101,28 +144,26 @@ def extract_with_rules_amazon(cluster_text):
     # =====================================================
     
     # Order/Invoice Numbers
-    m = re.search(r"Order (Number|Id)[:\s]*([\w\-]+)", text, re.I)
+    m = search(_ORDER_NUM_RE, "order number", "order id")
     data["order_number"] = m.group(2).strip() if m else ""
     
-    m = re.search(r"Invoice (No|Number)[:\s]*([\w\-]+)", text, re.I)
+    m = search(_INVOICE_NUM_RE, "invoice no", "invoice number")
     data["invoice_number"] = m.group(2).strip() if m else ""
     
     # Dates
-    date_pattern = r"\d{2}[./-]\d{2}[./-]\d{4}"
-    m = re.search(r"Order Date[:\s]*(" + date_pattern + ")", text, re.I)
+    m = search(_ORDER_DATE_RE, "order date")
     data["order_date"] = m.group(1) if m else ""
     
-    m = re.search(r"Invoice Date[:\s]*(" + date_pattern + ")", text, re.I)
+    m = search(_INVOICE_DATE_RE, "invoice date")
     data["invoice_date"] = m.group(1) if m else ""
     
     # =====================================================
     # INVOICE DETAILS - Stop before date
     # =====================================================
     
-    m = re.search(r"Invoice Details[:\s]*(.+?)(?=Invoice Date|Order Date|Sl\.)", text, re.I)
+    m = search(_INV_DETAILS_RE, "invoice details")
     if m:
         inv_detail = m.group(1).strip()
-        inv_detail = re.sub(r'\s+', ' ', inv_detail)
         data["invoice_details"] = inv_detail[:100]
     else:
         data["invoice_details"] = ""
@@ -136,19 +177,11 @@ def extract_with_rules_amazon(cluster_text):
     # =====================================================
 
     # Billing Address - capture until AND including 6-digit pin code
-    m = re.search(
-        r"Billing Address[:\s]*([\s\S]*?\d{6})",
-        text,
-        re.I | re.S
-    )
+    m = search(_BILL_ADDR_RE, "billing address")
     data["billing_address"] = m.group(1).strip() if m else ""
 
     # Shipping Address - capture until AND including 6-digit pin code
-    m = re.search(
-        r"Shipping Address[:\s]*([\s\S]*?\d{6})",
-        text,
-        re.I | re.S
-    )
+    m = search(_SHIP_ADDR_RE, "shipping address")
     data["shipping_address"] = m.group(1).strip() if m else ""
 
     
@@ -156,32 +189,32 @@ def extract_with_rules_amazon(cluster_text):
     # SELLER INFO
     # =====================================================
     
-    m = re.search(r"Sold By[:\s]*([^,\n]+)", text, re.I)
+    m = search(_SELLER_NAME_RE, "sold by")
     data["seller_name"] = m.group(1).strip() if m else ""
     
-    m = re.search(r"Sold By[:\s]*(.+?)(?=PAN No|GST Registration|Billing Address)", text, re.I | re.S)
+    m = search(_SELLER_ADDR_RE, "sold by")
     data["seller_address"] = m.group(1).strip() if m else ""
     
     # =====================================================
     # TAX IDs
     # =====================================================
     
-    m = re.search(r"GST Registration No[:\s]*(\d{2}[A-Z]{5}\d{4}[A-Z][1-9A-Z]Z[0-9A-Z])", text, re.I)
+    m = search(_GST_RE, "gst registration no")
     data["seller_gst"] = m.group(1) if m else ""
     
-    m = re.search(r"PAN No[:\s]*([A-Z]{5}\d{4}[A-Z])", text, re.I)
+    m = search(_PAN_RE, "pan no")
     data["seller_pan"] = m.group(1) if m else ""
     
     # =====================================================
     # STATE & PLACE
     # =====================================================
     
-    m = re.search(r"State/UT Code[:\s]*(\d{1,2})", text, re.I)
+    m = search(_STATE_CODE_RE, "state/ut code")
     state_code = m.group(1) if m else ""
     data["billing_state_code"] = state_code
     data["shipping_state_code"] = state_code
     
-    m = re.search(r"Place of (?:supply|delivery)[:\s]*([A-Z\s]+?)(?=Place of|Invoice|$)", text, re.I)
+    m = search(_PLACE_RE, "place of supply", "place of delivery")
     data["place_of_supply"] = m.group(1).strip() if m else ""
     data["place_of_delivery"] = m.group(1).strip() if m else ""
     
@@ -189,10 +222,9 @@ def extract_with_rules_amazon(cluster_text):
     # AMOUNT IN WORDS
     # =====================================================
     
-    m = re.search(r"Amount in Words[:\s]*(.+?)(?=Net|Tax|Whether|$)", text, re.I)
+    m = search(_AMT_WORDS_RE, "amount in words")
     if m:
         amt_words = m.group(1).strip()
-        amt_words = re.sub(r'\s+', ' ', amt_words)
         data["amount_in_words"] = amt_words[:100]
     else:
         data["amount_in_words"] = ""
@@ -208,9 +240,9 @@ def extract_with_rules_amazon(cluster_text):
     return data
 
 
-def extract_item_table_amazon(pdf_path):
+def extract_item_table_amazon(pdf_or_path):
     """Extract line items from Amazon invoice"""
-    with pdfplumber.open(pdf_path) as pdf:
+    with open_pdf(pdf_or_path) as pdf:
         for page in pdf.pages:
             tables = page.extract_tables()
             if not tables:
@@ -218,16 +250,19 @@ def extract_item_table_amazon(pdf_path):
             for table in tables:
                 table = [r for r in table if any(c and c.strip() for c in r)]
 
-                if not table:
+                # Item tables are wide; skip narrow layout/summary tables early
+                if not table or len(table[0]) < 6:
                     continue
                 
                 header = [str(c).lower() if c else "" for c in table[0]]
 
-                if (
-                    any("description" in h for h in header)
-                    and any("qty" in h or "quantity" in h for h in header)
-                    and any("total" in h for h in header)
-                ):
+                has_desc = has_qty = has_total = False
+                for h in header:
+                    has_desc = has_desc or "description" in h
+                    has_qty = has_qty or "qty" in h or "quantity" in h
+                    has_total = has_total or "total" in h
+
+                if has_desc and has_qty and has_total:
                     rows = [
                         [cell.strip() if cell else "" for cell in row]
                         for row in table[1:]
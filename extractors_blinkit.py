@@ -1,6 +1,18 @@
 import re
-import pdfplumber
 import pandas as pd
+from pdf_utils import cache_per_file, open_pdf
+
+
+# Precompiled cell patterns
+_INVOICE_NUM_RE = re.compile(r"Invoice Number\s*:\s*([\w\-]+)")
+_GSTIN_RE = re.compile(r"GSTIN\s*:\s*([\w\d]+)")
+_FSSAI_RE = re.compile(r"FSSAI.*?(\d{10,})")
+_ORDER_ID_RE = re.compile(r"Order Id\s*:\s*(\d+)")
+_INVOICE_TO_RE = re.compile(r"Invoice To Name\s*:\s*([^,]+)", re.I)
+_ADDRESS_RE = re.compile(r"Address\s*:\s*(.*?)(Order Id|$)", re.I)
+_INVOICE_DATE_RE = re.compile(r"Invoice\s*:\s*([\w\-]+)")
+_PLACE_RE = re.compile(r"Place of\s*:\s*(\w+)", re.I)
+_AMT_WORDS_RE = re.compile(r"Amount in\s+(.*?)\s+Words", re.I)
 
 
 def safe_float(val):
@@ -13,24 +25,31 @@ def safe_float(val):
 
 def clean(text):
     """Clean whitespace from text"""
-    return re.sub(r"\s+", " ", str(text)).strip()
+    return " ".join(str(text).split())
+
 
+@cache_per_file()
+def load_table(pdf_or_path):
+    """Main invoice table (first table on page 1) as a list of rows"""
+    with open_pdf(pdf_or_path) as pdf:
+        return pdf.pages[0].extract_tables()[0]
 
-def extract_header(df):
+
+def extract_header(table):
     """Extract header data from Blinkit invoice table"""
     data = {}
 
     # -------------------------
     # R1 C10 → Invoice Number
     # -------------------------
-    r1c10 = clean(df.iloc[1, 10])
-    m = re.search(r"Invoice Number\s*:\s*([\w\-]+)", r1c10)
+    r1c10 = clean(table[1][10])
+    m = _INVOICE_NUM_RE.search(r1c10)
     data["invoice_number"] = m.group(1) if m else ""
 
     # -------------------------
     # Seller name & address (R1 C0)
     # -------------------------
-    r1c0 = clean(df.iloc[1, 0])
+    r1c0 = clean(table[1][0])
     seller_name = "Zomato Hyperpure Private Limited ZHPL"
     data["seller_name"] = seller_name
     if seller_name in r1c0:
@@ -42,25 +61,25 @@ def extract_header(df):
     # -------------------------
     # R2 C0 → GSTIN
     # -------------------------
-    r2c0 = clean(df.iloc[2, 0])
-    m = re.search(r"GSTIN\s*:\s*([\w\d]+)", r2c0)
+    r2c0 = clean(table[2][0])
+    m = _GSTIN_RE.search(r2c0)
     data["seller_gst"] = m.group(1) if m else ""
 
     # -------------------------
     # R3 C0 → FSSAI
     # -------------------------
-    r3c0 = clean(df.iloc[3, 0])
-    m = re.search(r"FSSAI.*?(\d{10,})", r3c0)
+    r3c0 = clean(table[3][0])
+    m = _FSSAI_RE.search(r3c0)
     data["fssai_license"] = m.group(1) if m else ""
 
     # -------------------------
     # R4 C0 → Invoice To + Address
     # -------------------------
-    r4c0 = clean(df.iloc[4, 0])
-    m = re.search(r"Invoice To Name\s*:\s*([^,]+)", r4c0, re.I)
+    r4c0 = clean(table[4][0])
+    m = _INVOICE_TO_RE.search(r4c0)
     data["invoice_to"] = m.group(1).strip() if m else ""
 
-    m = re.search(r"Address\s*:\s*(.*?)(Order Id|$)", r4c0, re.I)
+    m = _ADDRESS_RE.search(r4c0)
     address = m.group(1).strip() if m else ""
     data["billing_address"] = address
     data["shipping_address"] = address
@@ -68,15 +87,15 @@ def extract_header(df):
     # -------------------------
     # R4 C10 → Order / Date / Place
     # -------------------------
-    r4c10 = clean(df.iloc[4, 10])
-    m = re.search(r"Order Id\s*:\s*(\d+)", r4c10)
+    r4c10 = clean(table[4][10])
+    m = _ORDER_ID_RE.search(r4c10)
     data["order_number"] = m.group(1) if m else ""
 
-    m = re.search(r"Invoice\s*:\s*([\w\-]+)", r4c10)
+    m = _INVOICE_DATE_RE.search(r4c10)
     data["invoice_date"] = m.group(1) if m else ""
     data["order_date"] = data["invoice_date"]
 
-    m = re.search(r"Place of\s*:\s*(\w+)", r4c10, re.I)
+    m = _PLACE_RE.search(r4c10)
     pos = m.group(1) if m else ""
     data["place_of_supply"] = pos
     data["place_of_delivery"] = pos
@@ -84,8 +103,8 @@ def extract_header(df):
     # -------------------------
     # R8 C0 → Amount in Words
     # -------------------------
-    r8c0 = clean(df.iloc[8, 0])
-    m = re.search(r"Amount in\s+(.*?)\s+Words", r8c0, re.I)
+    r8c0 = clean(table[8][0])
+    m = _AMT_WORDS_RE.search(r8c0)
     data["amount_in_words"] = m.group(1).strip() if m else ""
 
     data["invoice_type"] = "Tax Invoice"
@@ -93,18 +112,16 @@ def extract_header(df):
     return data
 
 
-def extract_items_and_totals(df):
+def extract_items_and_totals(table):
     """Extract line items and totals from Blinkit invoice table"""
-    items = []
+    desc_col, unit_col, disc_col, qty_col = [], [], [], []
+    net_col, tax_col, total_col = [], [], []
     total_tax = 0.0
     total_amount = 0.0
-    sl = 1
 
     FIRST_ITEM_ROW = 6
 
-    for i in range(FIRST_ITEM_ROW, len(df)):
-        row = df.iloc[i]
-
+    for row in table[FIRST_ITEM_ROW:]:
         # TOTAL ROW
         if str(row[0]).strip().lower() == "total":
             total_tax = safe_float(row[8]) + safe_float(row[10])
@@ -118,22 +135,29 @@ def extract_items_and_totals(df):
 
         net_val = safe_float(row[6])
         total_val = safe_float(row[13])
-        tax_val = round(total_val - net_val, 2)
-
-        items.append(
-            {
-                "Sl.No": sl,
-                "Description": desc,
-                "UnitPrice": safe_float(row[3]),
-                "Discount": safe_float(row[4]),
-                "Qty": safe_float(row[5]),
-                "NetAmount": net_val,
-                "TaxRate": "",
-                "TaxType": "GST",
-                "TaxAmount": tax_val,
-                "TotalAmount": total_val,
-            }
-        )
-        sl += 1
-
-    return pd.DataFrame(items), round(total_tax, 2), round(total_amount, 2)
\ No newline at end of file
+
+        desc_col.append(desc)
+        unit_col.append(safe_float(row[3]))
+        disc_col.append(safe_float(row[4]))
+        qty_col.append(safe_float(row[5]))
+        net_col.append(net_val)
+        tax_col.append(round(total_val - net_val, 2))
+        total_col.append(total_val)
+
+    n = len(desc_col)
+    items = pd.DataFrame(
+        {
+            "Sl.No": pd.Series(range(1, n + 1), dtype="int64"),
+            "Description": pd.Series(desc_col, dtype="object"),
+            "UnitPrice": pd.Series(unit_col, dtype="float64"),
+            "Discount": pd.Series(disc_col, dtype="float64"),
+            "Qty": pd.Series(qty_col, dtype="float64"),
+            "NetAmount": pd.Series(net_col, dtype="float64"),
+            "TaxRate": pd.Series([""] * n, dtype="object"),
+            "TaxType": pd.Series(["GST"] * n, dtype="object"),
+            "TaxAmount": pd.Series(tax_col, dtype="float64"),
+            "TotalAmount": pd.Series(total_col, dtype="float64"),
+        }
+    )
+
+    return items, round(total_tax, 2), round(total_amount, 2)
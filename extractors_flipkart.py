@@ -1,16 +1,46 @@
-import os
 import re
-import pdfplumber
+from pdf_utils import cache_per_file, open_pdf
 import pandas as pd
 import numpy as np
-from sklearn.cluster import DBSCAN
-
-
-def extract_cluster_text(pdf_path):
-    """Extract clustered text from Flipkart invoice using DBSCAN"""
+from clustering import cluster_points
+
+
+# Precompiled field patterns for extract_fields
+_ORDER_ID_RE = re.compile(r"Order\s*Id[:\s]*([A-Z0-9]+)", re.I)
+_ORDER_DATE_RE = re.compile(r"Order\s*Date[:\s]*([\d\-,: ]+[APM]{2})", re.I)
+_INVOICE_NO_RE = re.compile(r"Invoice\s*No[:\s]*([A-Z0-9]+)", re.I)
+_INVOICE_DATE_RE = re.compile(r"Invoice\s*Date[:\s]*([\d\-,: ]+[APM]{2})", re.I)
+_GSTIN_RE = re.compile(r"GSTIN[:\s]*([0-9A-Z]{15})", re.I)
+_PAN_RE = re.compile(r"PAN[:\s]*([A-Z]{5}\d{4}[A-Z])", re.I)
+_SELLER_NAME_RE = re.compile(r"Sold\s*By\s+([^,|]+)", re.I)
+_SELLER_ADDR_RE = re.compile(
+    r"Sold\s*By.*?,\s*(.*?)\s*(Billing\s*Address|BillingAddress)", re.I | re.S
+)
+_BILL_ADDR_RE = re.compile(
+    r"Billing\s*Address\s+(.*?)\s+Shipping\s*ADDRESS", re.I | re.S
+)
+_SHIP_ADDR_RE = re.compile(
+    r"Shipping\s*ADDRESS\s+(.*?)\s+Seller\s*Registered\s*Address", re.I | re.S
+)
+_TOTAL_PRICE_RE = re.compile(r"TOTAL\s*PRICE[:\s]*([\d.]+)", re.I)
+_STATE_RE = re.compile(r"IN-([A-Z]{2})", re.I)
+_NUM_TOKEN_RE = re.compile(r"\d+\.\d+|\d+")
+
+
+def safe_float(val):
+    """Convert value to float safely"""
+    try:
+        return float(str(val).replace(",", "").strip())
+    except ValueError:
+        return 0.0
+
+
+@cache_per_file()
+def extract_cluster_text(pdf_or_path):
+    """Extract clustered text from Flipkart invoice by grouping nearby characters"""
     blocks = []
 
-    with pdfplumber.open(pdf_path) as pdf:
+    with open_pdf(pdf_or_path) as pdf:
         for page in pdf.pages:
             chars = page.chars
 
@@ -22,27 +52,23 @@ def extract_cluster_text(pdf_path):
 
             if tables:
                 table = max(tables, key=len)
-                max_cols = max(len([c for c in row if c]) for row in table)
-
-            points, refs = [], []
-
-            for ch in chars:
-                x = (ch["x0"] + ch["x1"]) / 2
-                y = (ch["top"] + ch["bottom"]) / 2
-                points.append([x, y])
-                refs.append(ch)
+                max_cols = max(sum(1 for c in row if c) for row in table)
 
-            points = np.array(points)
+            refs = chars
+            a = np.fromiter(
+                (v for ch in chars for v in (ch["x0"], ch["x1"], ch["top"], ch["bottom"])),
+                dtype=np.float64,
+                count=4 * len(chars),
+            ).reshape(-1, 4)
+            points = np.column_stack(((a[:, 0] + a[:, 1]) / 2, (a[:, 2] + a[:, 3]) / 2))
 
             if max_cols >= 6:
                 points = (points - points.mean(axis=0)) / points.std(axis=0)
-                labels = DBSCAN(eps=0.1, min_samples=1).fit_predict(points)
+                labels = cluster_points(points, eps=0.1)
             else:
                 x = (points[:, 0] - points[:, 0].mean()) / points[:, 0].std()
                 y = (points[:, 1] - points[:, 1].mean()) / points[:, 1].std()
-                labels = DBSCAN(eps=0.12, min_samples=1).fit_predict(
-                    np.column_stack([x * 3, y])
-                )
+                labels = cluster_points(np.column_stack([x * 3, y]), eps=0.12)
 
             clusters = {}
 
@@ -52,16 +78,17 @@ def extract_cluster_text(pdf_path):
 
             for group in clusters.values():
                 group = sorted(group, key=lambda c: (c["top"], c["x0"]))
-                text, prev_top = "", None
+                parts, prev_top = [], None
 
                 for ch in group:
                     if prev_top is not None and abs(ch["top"] - prev_top) > 3:
-                        text += " "
-                    text += ch["text"]
+                        parts.append(" ")
+                    parts.append(ch["text"])
                     prev_top = ch["top"]
 
-                if len(text.strip()) > 30:
-                    blocks.append(text.strip())
+                text = "".join(parts).strip()
+                if len(text) > 30:
+                    blocks.append(text)
 
     return " | ".join(blocks)
 
@@ -69,8 +96,13 @@ def extract_cluster_text(pdf_path):
 def extract_fields(cluster: str):
     """Extract field data from clustered text using regex"""
 
-    def grab(pattern, flags=re.I):
-        m = re.search(pattern, cluster, flags)
+    cluster_lower = cluster.lower()
+
+    def grab(rx, anchor):
+        # Cheap substring check first; anchor is a literal every match contains
+        if anchor not in cluster_lower:
+            return ""
+        m = rx.search(cluster)
         return m.group(1).strip() if m else ""
 
     data = {}
@@ -78,42 +110,33 @@ def extract_fields(cluster: str):
     data["invoice_type"] = "Tax Invoice"
 
     # Order / invoice basics
-    data["order_number"] = grab(r"Order\s*Id[:\s]*([A-Z0-9]+)")
-    data["order_date"] = grab(r"Order\s*Date[:\s]*([\d\-,: ]+[APM]{2})")
-    data["invoice_number"] = grab(r"Invoice\s*No[:\s]*([A-Z0-9]+)")
-    data["invoice_date"] = grab(r"Invoice\s*Date[:\s]*([\d\-,: ]+[APM]{2})")
+    data["order_number"] = grab(_ORDER_ID_RE, "order")
+    data["order_date"] = grab(_ORDER_DATE_RE, "order")
+    data["invoice_number"] = grab(_INVOICE_NO_RE, "invoice")
+    data["invoice_date"] = grab(_INVOICE_DATE_RE, "invoice")
 
     # Tax IDs
-    data["seller_gst"] = grab(r"GSTIN[:\s]*([0-9A-Z]{15})")
-    data["seller_pan"] = grab(r"PAN[:\s]*([A-Z]{5}\d{4}[A-Z])")
+    data["seller_gst"] = grab(_GSTIN_RE, "gstin")
+    data["seller_pan"] = grab(_PAN_RE, "pan")
 
     # Seller name: after 'Sold By' up to first comma
-    data["seller_name"] = grab(r"Sold\s*By\s+([^,|]+)")
+    data["seller_name"] = grab(_SELLER_NAME_RE, "sold")
 
     # Seller address: between seller name and 'Billing Address' or 'BillingAddress'
-    data["seller_address"] = grab(
-        r"Sold\s*By.*?,\s*(.*?)\s*(Billing\s*Address|BillingAddress)",
-        flags=re.I | re.S,
-    )
+    data["seller_address"] = grab(_SELLER_ADDR_RE, "sold")
 
     # Billing / shipping blocks – tolerant to spaces/case, stop before next marker
-    data["billing_address"] = grab(
-        r"Billing\s*Address\s+(.*?)\s+Shipping\s*ADDRESS",
-        flags=re.I | re.S,
-    )
+    data["billing_address"] = grab(_BILL_ADDR_RE, "billing")
 
-    data["shipping_address"] = grab(
-        r"Shipping\s*ADDRESS\s+(.*?)\s+Seller\s*Registered\s*Address",
-        flags=re.I | re.S,
-    )
+    data["shipping_address"] = grab(_SHIP_ADDR_RE, "shipping")
 
     # Total amount – handle "TOTAL PRICE"
-    data["total_amount"] = grab(r"TOTAL\s*PRICE[:\s]*([\\d.]+)")
+    data["total_amount"] = safe_float(grab(_TOTAL_PRICE_RE, "total"))
 
     data["reverse_charge"] = "No"
 
     # State codes from IN-XX
-    state = grab(r"IN-([A-Z]{2})")
+    state = grab(_STATE_RE, "in-")
 
     data["billing_state_code"] = state
     data["shipping_state_code"] = state
@@ -132,9 +155,9 @@ def extract_fields(cluster: str):
     return data
 
 
-def extract_line_items(pdf_path):
+def extract_line_items(pdf_or_path):
     """Extract line items from Flipkart invoice"""
-    with pdfplumber.open(pdf_path) as pdf:
+    with open_pdf(pdf_or_path) as pdf:
         page = pdf.pages[0]
         tables = page.extract_tables()
 
@@ -152,7 +175,7 @@ def extract_line_items(pdf_path):
         rows, desc = [], []
 
         for line in lines:
-            nums = re.findall(r"\d+\.\d+|\d+", line)
+            nums = _NUM_TOKEN_RE.findall(line)
 
             if len(nums) >= 6:
                 rows.append((desc, nums[-6:]))
@@ -160,7 +183,8 @@ def extract_line_items(pdf_path):
             else:
                 desc.append(line)
 
-        items = []
+        sl_col, desc_col, unit_col, disc_col, qty_col = [], [], [], [], []
+        net_col, tax_col, total_col = [], [], []
 
         for i, (d, n) in enumerate(rows, 1):
             full_desc = " ".join(d)
@@ -168,19 +192,26 @@ def extract_line_items(pdf_path):
             if any(k in full_desc.lower() for k in ["shipping", "handling"]):
                 continue
 
-            items.append(
-                {
-                    "Sl.No": i,
-                    "Description": full_desc,
-                    "UnitPrice": n[1],
-                    "Discount": n[2],
-                    "Qty": n[0],
-                    "NetAmount": n[3],
-                    "TaxRate": "",
-                    "TaxType": "IGST",
-                    "TaxAmount": n[4],
-                    "TotalAmount": n[5],
-                }
-            )
-
-        return pd.DataFrame(items)
\ No newline at end of file
+            sl_col.append(i)
+            desc_col.append(full_desc)
+            unit_col.append(n[1])
+            disc_col.append(n[2])
+            qty_col.append(n[0])
+            net_col.append(n[3])
+            tax_col.append(n[4])
+            total_col.append(n[5])
+
+        return pd.DataFrame(
+            {
+                "Sl.No": sl_col,
+                "Description": desc_col,
+                "UnitPrice": unit_col,
+                "Discount": disc_col,
+                "Qty": qty_col,
+                "NetAmount": net_col,
+                "TaxRate": [""] * len(sl_col),
+                "TaxType": ["IGST"] * len(sl_col),
+                "TaxAmount": tax_col,
+                "TotalAmount": total_col,
+            }
+        )
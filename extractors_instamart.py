@@ -1,6 +1,26 @@
 import re
-import pdfplumber
 import pandas as pd
+from pdf_utils import open_pdf
+
+
+_NON_ALPHA_RE = re.compile(r"[^a-zA-Z]")
+
+# Labels the PDF sometimes renders without spaces, fixed in one regex pass
+_FIX = {
+    "InvoiceTo": "Invoice To",
+    "CustomerAddress": "Customer Address",
+    "OrderID": "Order ID",
+    "InvoiceNo": "Invoice No",
+    "DateofInvoice": "Date of Invoice",
+    "SellerName": "Seller Name",
+    "SellerGSTIN": "Seller GSTIN",
+    "PlaceofSupply": "Place of Supply",
+}
+_GLUED_RE = re.compile("|".join(map(re.escape, _FIX)))
+
+# "Label: value" lines read from each header column
+LEFT_KEYS = ("Order ID", "Invoice No", "Date of Invoice")
+RIGHT_KEYS = ("Seller Name", "Seller GSTIN", "FSSAI", "Place of Supply")
 
 
 def safe_float(val):
@@ -11,49 +31,40 @@ def safe_float(val):
         return None
 
 
-def chars_to_lines(chars, y_tol=3, x_gap=3):
-    """Convert characters to lines with layout awareness"""
-    buckets = []
-
-    for ch in sorted(chars, key=lambda c: (c["top"], c["x0"])):
-        placed = False
-        for b in buckets:
-            if abs(b["y"] - ch["top"]) <= y_tol:
-                b["chars"].append(ch)
-                placed = True
-                break
-
-        if not placed:
-            buckets.append({"y": ch["top"], "chars": [ch]})
-
+def words_to_lines(words, y_tol=3):
+    """Group pdfplumber words into text lines, top to bottom"""
+    # Sorted by top, a word can only belong to the line currently being built:
+    # line anchors are more than y_tol apart, so no earlier line is in reach.
     lines = []
-    for b in sorted(buckets, key=lambda x: x["y"]):
-        line = ""
-        prev_x1 = None
+    cur_y = None
 
-        for c in sorted(b["chars"], key=lambda c: c["x0"]):
-            if prev_x1 is not None and c["x0"] - prev_x1 > x_gap:
-                line += " "
-            line += c["text"]
-            prev_x1 = c["x1"]
+    for w in sorted(words, key=lambda w: (w["top"], w["x0"])):
+        if cur_y is None or abs(w["top"] - cur_y) > y_tol:
+            cur_y = w["top"]
+            lines.append([])
+        lines[-1].append(w)
 
-        clean = re.sub(r"\s+", " ", line).strip()
-        if clean:
-            lines.append(clean)
+    return [
+        " ".join(w["text"] for w in sorted(line, key=lambda w: w["x0"]))
+        for line in lines
+    ]
 
-    return lines
+
+def prefix_map(lines, keys):
+    """{key: value} for the first line starting with each key, in one pass"""
+    found = {}
+    for line in lines:
+        for key in keys:
+            if key not in found and line.startswith(key):
+                found[key] = line[len(key):].replace(":", "").strip()
+    return found
 
 
 def extract_amount_in_words(left_lines, right_lines):
     """Extract amount in words from left and right columns"""
-    all_lines = left_lines + right_lines
-    normalized = []
-
-    for l in all_lines:
-        clean = re.sub(r"[^a-zA-Z]", "", l).lower()
-        normalized.append(clean)
-
-    joined = " ".join(normalized)
+    joined = " ".join(
+        _NON_ALPHA_RE.sub("", l).lower() for l in (*left_lines, *right_lines)
+    )
 
     if "amountinwords" not in joined:
         return ""
@@ -63,47 +74,35 @@ def extract_amount_in_words(left_lines, right_lines):
     if "only" in text:
         text = text.split("only", 1)[0] + " only"
 
-    text = text.replace("rupees", " rupees ")
-    text = text.replace("paise", " paise ")
-    text = re.sub(r"\s+", " ", text).strip()
+    # Lines are already single-spaced; only the spaces added here can double up
+    text = " ".join(text.replace("rupees", " rupees ").replace("paise", " paise ").split())
 
     return text.capitalize()
 
 
-def extract_header(pdf_path):
-    """Extract header data from Instamart invoice"""
-    with pdfplumber.open(pdf_path) as pdf:
+def extract_header(pdf_or_path):
+    """Extract header data from Instamart invoice (PDF path or opened PDF)"""
+    with open_pdf(pdf_or_path) as pdf:
         page = pdf.pages[0]
-        chars = [c for c in page.chars if c["text"].strip()]
+        words = page.extract_words(x_tolerance=3, y_tolerance=3)
 
         mid_x = page.width / 2
 
-        left_chars, right_chars = [], []
+        left_words, right_words = [], []
 
-        for ch in chars:
-            x_center = (ch["x0"] + ch["x1"]) / 2
+        for w in words:
+            x_center = (w["x0"] + w["x1"]) / 2
             if x_center < mid_x:
-                left_chars.append(ch)
+                left_words.append(w)
             else:
-                right_chars.append(ch)
+                right_words.append(w)
 
-        left_lines = chars_to_lines(left_chars)
-        right_lines = chars_to_lines(right_chars)
+        left_lines = words_to_lines(left_words)
+        right_lines = words_to_lines(right_words)
 
         # Normalize glued labels
         def normalize(lines):
-            out = []
-            for l in lines:
-                l = l.replace("InvoiceTo", "Invoice To")
-                l = l.replace("CustomerAddress", "Customer Address")
-                l = l.replace("OrderID", "Order ID")
-                l = l.replace("InvoiceNo", "Invoice No")
-                l = l.replace("DateofInvoice", "Date of Invoice")
-                l = l.replace("SellerName", "Seller Name")
-                l = l.replace("SellerGSTIN", "Seller GSTIN")
-                l = l.replace("PlaceofSupply", "Place of Supply")
-                out.append(l)
-            return out
+            return [_GLUED_RE.sub(lambda m: _FIX[m.group(0)], l) for l in lines]
 
         left_lines = normalize(left_lines)
         right_lines = normalize(right_lines)
@@ -128,17 +127,8 @@ def extract_header(pdf_path):
         customer_address = " ".join(customer_addr_lines).strip()
 
         # ---------- SIMPLE GRABS
-        def grab_left(key):
-            for l in left_lines:
-                if l.startswith(key):
-                    return l.split(key, 1)[-1].replace(":", "").strip()
-            return ""
-
-        def grab_right(key):
-            for r in right_lines:
-                if r.startswith(key):
-                    return r.split(key, 1)[-1].replace(":", "").strip()
-            return ""
+        left = prefix_map(left_lines, LEFT_KEYS)
+        right = prefix_map(right_lines, RIGHT_KEYS)
 
         # ---------- SELLER ADDRESS (RIGHT, MULTI-LINE)
         seller_addr_lines = []
@@ -158,63 +148,69 @@ def extract_header(pdf_path):
                 seller_addr_lines.append(r)
 
         seller_address = " ".join(seller_addr_lines).strip()
-        seller_name = grab_right("Seller Name")
+        seller_name = right.get("Seller Name", "")
 
         # ---------- AMOUNT IN WORDS
         amount_in_words = extract_amount_in_words(left_lines, right_lines)
 
         data = {
             "invoice_type": "Tax Invoice",
-            "order_number": grab_left("Order ID"),
-            "invoice_number": grab_left("Invoice No"),
-            "invoice_details": grab_left("Invoice No"),
-            "invoice_date": grab_left("Date of Invoice"),
+            "order_number": left.get("Order ID", ""),
+            "invoice_number": left.get("Invoice No", ""),
+            "invoice_details": left.get("Invoice No", ""),
+            "invoice_date": left.get("Date of Invoice", ""),
             "billing_address": customer_address,
             "shipping_address": customer_address,
             "seller_name": seller_name,
             "seller_address": seller_address,
             "seller_info": f"{seller_name}, {seller_address}",
-            "seller_gst": grab_right("Seller GSTIN"),
-            "fssai_license": grab_right("FSSAI"),
-            "place_of_supply": grab_right("Place of Supply"),
-            "place_of_delivery": grab_right("Place of Supply"),
+            "seller_gst": right.get("Seller GSTIN", ""),
+            "fssai_license": right.get("FSSAI", ""),
+            "place_of_supply": right.get("Place of Supply", ""),
+            "place_of_delivery": right.get("Place of Supply", ""),
             "amount_in_words": amount_in_words,
         }
 
         return data
 
 
-def extract_items_and_totals(pdf_path):
-    """Extract line items and totals from Instamart invoice"""
-    items = []
-    total_tax = 0.0
-    total_amount = 0.0
-    sl = 1
+def tally(net_col, total_col):
+    """Per-item tax (total - net, to 2 dp) and the invoice's tax and amount totals"""
+    tax_col = [round(t - n, 2) for n, t in zip(net_col, total_col)]
+    return tax_col, round(sum(tax_col), 2), round(sum(total_col), 2)
+
 
-    with pdfplumber.open(pdf_path) as pdf:
+def extract_items_and_totals(pdf_or_path):
+    """Extract line items and totals from Instamart invoice (PDF path or opened PDF)"""
+    desc_col, qty_col, net_col, total_col = [], [], [], []
+
+    with open_pdf(pdf_or_path) as pdf:
         page = pdf.pages[0]
         tables = page.extract_tables()
 
         for table in tables:
-            df = pd.DataFrame(table).dropna(how="all")
+            # Same rows dropna(how="all") kept, without building a DataFrame
+            rows = [r for r in table if any(c is not None for c in r)]
 
-            if len(df) < 4:
+            if len(rows) < 4:
                 continue
 
-            header_text = " ".join(df.iloc[2].astype(str).tolist()).lower()
+            header_text = " ".join(str(c) for c in rows[2]).lower()
 
             if "description of goods" not in header_text:
                 continue
 
-            df_items = df.iloc[3:].reset_index(drop=True)
-
-            for _, row in df_items.iterrows():
+            for row in rows[3:]:
                 if len(row) < 16:
                     continue
 
                 desc = str(row[1]).strip()
 
-                if not desc or "invoice value" in desc.lower():
+                # "Invoice Value" closes the item block
+                if "invoice value" in desc.lower():
+                    break
+
+                if not desc:
                     continue
 
                 net_val = safe_float(row[7])
@@ -223,27 +219,32 @@ def extract_items_and_totals(pdf_path):
                 if net_val is None or total_val is None:
                     continue
 
-                tax_val = round(total_val - net_val, 2)
-
-                items.append(
-                    {
-                        "Sl.No": sl,
-                        "Description": desc.replace("\n", " "),
-                        "UnitPrice": "",
-                        "Discount": "",
-                        "Qty": safe_float(row[2]),
-                        "NetAmount": net_val,
-                        "TaxRate": "",
-                        "TaxType": "GST",
-                        "TaxAmount": tax_val,
-                        "TotalAmount": total_val,
-                    }
-                )
-
-                total_tax += tax_val
-                total_amount += total_val
-                sl += 1
+                desc_col.append(desc.replace("\n", " "))
+                qty_col.append(safe_float(row[2]))
+                net_col.append(net_val)
+                total_col.append(total_val)
 
             break  # correct table processed
 
-    return pd.DataFrame(items), round(total_tax, 2), round(total_amount, 2)
\ No newline at end of file
+    if not desc_col:
+        return pd.DataFrame(), 0.0, 0.0
+
+    tax_col, total_tax, total_amount = tally(net_col, total_col)
+
+    n = len(desc_col)
+    items = pd.DataFrame(
+        {
+            "Sl.No": range(1, n + 1),
+            "Description": desc_col,
+            "UnitPrice": [""] * n,
+            "Discount": [""] * n,
+            "Qty": qty_col,
+            "NetAmount": net_col,
+            "TaxRate": [""] * n,
+            "TaxType": ["GST"] * n,
+            "TaxAmount": tax_col,
+            "TotalAmount": total_col,
+        }
+    )
+
+    return items, total_tax, total_amount
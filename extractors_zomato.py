@@ -1,8 +1,32 @@
 import re
-import pdfplumber
+from pdf_utils import open_pdf
 import pandas as pd
 
 
+# Precompiled field patterns for extract_with_rules_zomato
+_WS_RE = re.compile(r"\s+")
+_INVOICE_NO_RE = re.compile(r"Invoice No\.?\s*:\s*([\w\d]+)", re.I)
+_INVOICE_DATE_RE = re.compile(r"Invoice Date\s*:\s*([\d/]+)", re.I)
+_ORDER_ID_RE = re.compile(r"Order ID\s*:\s*(\d+)", re.I)
+_SELLER_NAME_RE = re.compile(r"Restaurant Name\s*:\s*(.*?)Restaurant Address", re.I)
+_SELLER_ADDR_RE = re.compile(r"Restaurant Address\s*:\s*(.*?)Restaurant GSTIN", re.I)
+_SELLER_GST_RE = re.compile(r"Restaurant GSTIN\s*:\s*([\w\d]+)", re.I)
+_FSSAI_RE = re.compile(r"Restaurant FSSAI\s*:\s*(\d+)", re.I)
+_DELIVERY_ADDR_RE = re.compile(r"Delivery Address\s*:\s*(.*?)State name", re.I)
+_PLACE_RE = re.compile(r"State name.*?:\s*(.*?)\(", re.I)
+_STATE_CODE_RE = re.compile(r"\((\d{2})\)", re.I)
+_AMT_WORDS_RE = re.compile(r"Amount \(in words\)\s*:\s*(.*?Only)", re.I)
+
+# Item and total rows of the particulars table, as they appear in page text
+_N = r"[\d,.]+"
+_ITEM_RE = re.compile(
+    rf"(?P<desc>.+?)\s+(?P<gross>{_N})\s+(?P<disc>{_N})\s+(?P<net>{_N})"
+    rf"\s+(?P<cgst_rate>[\d.]+%)\s+(?P<cgst>{_N})"
+    rf"\s+(?P<sgst_rate>[\d.]+%)\s+(?P<sgst>{_N})\s+(?P<total>{_N})"
+)
+_TOTAL_RE = re.compile(rf"^Total Value\s+(?P<net>{_N})\b.*\s(?P<total>{_N})$", re.M | re.I)
+
+
 def safe_float(val):
     """Convert value to float safely"""
     if val is None:
@@ -14,48 +38,115 @@ def safe_float(val):
         return 0.0
 
 
+def safe_float_column(col):
+    """Vectorized safe_float for a whole column; 0.0 where a cell is not a number"""
+    return pd.to_numeric(
+        col.astype(str)
+        .str.replace("%", "", regex=False)
+        .str.replace(",", "", regex=False)
+        .str.strip(),
+        errors="coerce",
+    ).astype(float).fillna(0.0)
+
+
 def extract_with_rules_zomato(full_text):
     """Extract fields from Zomato invoice text"""
-    text = re.sub(r"\s+", " ", full_text).strip()
+    text = _WS_RE.sub(" ", full_text).strip()
 
-    def grab(pattern):
-        m = re.search(pattern, text, re.I)
+    def grab(rx):
+        m = rx.search(text)
         return m.group(1).strip() if m else ""
 
     data = {}
     data["invoice_type"] = "Tax Invoice"
-    data["invoice_number"] = grab(r"Invoice No\.?\s*:\s*([\w\d]+)")
-    data["invoice_date"] = grab(r"Invoice Date\s*:\s*([\d/]+)")
-    data["order_number"] = grab(r"Order ID\s*:\s*(\d+)")
+    data["invoice_number"] = grab(_INVOICE_NO_RE)
+    data["invoice_date"] = grab(_INVOICE_DATE_RE)
+    data["order_number"] = grab(_ORDER_ID_RE)
 
     # ---- Seller = Restaurant
-    data["seller_name"] = grab(r"Restaurant Name\s*:\s*(.*?)Restaurant Address")
-    data["seller_address"] = grab(r"Restaurant Address\s*:\s*(.*?)Restaurant GSTIN")
-    data["seller_gst"] = grab(r"Restaurant GSTIN\s*:\s*([\w\d]+)")
-    data["fssai_license"] = grab(r"Restaurant FSSAI\s*:\s*(\d+)")
+    data["seller_name"] = grab(_SELLER_NAME_RE)
+    data["seller_address"] = grab(_SELLER_ADDR_RE)
+    data["seller_gst"] = grab(_SELLER_GST_RE)
+    data["fssai_license"] = grab(_FSSAI_RE)
     data["seller_info"] = f"{data['seller_name']}, {data['seller_address']}"
 
     # ---- Buyer / Receiver
-    delivery_addr = grab(r"Delivery Address\s*:\s*(.*?)State name")
+    delivery_addr = grab(_DELIVERY_ADDR_RE)
     data["billing_address"] = delivery_addr
     data["shipping_address"] = delivery_addr
-    data["place_of_supply"] = grab(r"State name.*?:\s*(.*?)\(")
+    data["place_of_supply"] = grab(_PLACE_RE)
     data["place_of_delivery"] = data["place_of_supply"]
 
-    state_code = grab(r"\((\d{2})\)")
+    state_code = grab(_STATE_CODE_RE)
     data["billing_state_code"] = state_code
     data["shipping_state_code"] = state_code
-    data["amount_in_words"] = grab(r"Amount \(in words\)\s*:\s*(.*?Only)")
+    data["amount_in_words"] = grab(_AMT_WORDS_RE)
 
     return data
 
 
-def extract_table_and_totals(pdf_path):
-    """Extract line items and totals from Zomato invoice"""
-    line_items = []
+def extract_items_from_text(full_text):
+    """Line items and totals read from the invoice text, None if unsure of them"""
+    start = full_text.find("Particulars")
+    total = _TOTAL_RE.search(full_text, start)
+    if start < 0 or not total:
+        return None
+
+    # Every line between the table header and Total Value must be a complete
+    # item row; a wrapped description leaves a stray line, so fall back then
+    rows = []
+    for line in full_text[start:total.start()].splitlines():
+        m = _ITEM_RE.fullmatch(line)
+        if m:
+            rows.append(m)
+        elif not (
+            line.startswith(("Particulars", "Item(s) Total")) or "(Rate)" in line
+        ):
+            return None
+
+    if not rows:
+        return None
+
+    net_value = safe_float(total["net"])
+    total_value = safe_float(total["total"])
+    totals = [safe_float(m["total"]) for m in rows]
+
+    # Rows found must account for the invoice total
+    if abs(sum(totals) - total_value) > 0.01:
+        return None
+
+    n = len(rows)
+    line_df = pd.DataFrame(
+        {
+            "Sl.No": range(1, n + 1),
+            "Description": [m["desc"] for m in rows],
+            "UnitPrice": [safe_float(m["gross"]) for m in rows],
+            "Discount": [safe_float(m["disc"]) for m in rows],
+            "Qty": [1] * n,
+            "NetAmount": [safe_float(m["net"]) for m in rows],
+            "TaxRate": [f"{m['cgst_rate']} + {m['sgst_rate']}" for m in rows],
+            "TaxType": ["CGST+SGST"] * n,
+            "TaxAmount": [safe_float(m["cgst"]) + safe_float(m["sgst"]) for m in rows],
+            "TotalAmount": totals,
+        }
+    )
+    return line_df, net_value, round(total_value - net_value, 2), total_value
+
+
+def extract_table_and_totals(pdf_or_path, full_text=None):
+    """Extract line items and totals from Zomato invoice.
+
+    Rows are read from full_text when it is given and its rows add up;
+    otherwise the page tables are extracted.
+    """
+    if full_text is not None:
+        found = extract_items_from_text(full_text)
+        if found is not None:
+            return found
+
     net_value = total_value = tax_value = 0.0
 
-    with pdfplumber.open(pdf_path) as pdf:
+    with open_pdf(pdf_or_path) as pdf:
         for page in pdf.pages:
             tables = page.extract_tables()
             if not tables:
@@ -76,53 +167,47 @@ def extract_table_and_totals(pdf_path):
                 df = df.iloc[1:].reset_index(drop=True)
 
                 def find_col(keys):
-                    for c in df.columns:
+                    for i, c in enumerate(df.columns):
                         if all(k in c for k in keys):
-                            return c
+                            return df.iloc[:, i]
                     return None
 
                 part_col = find_col(["particular"])
-                gross_col = find_col(["gross"])
-                disc_col = find_col(["discount"])
-                net_col = find_col(["net"])
-                cgst_rate_col = find_col(["cgst", "rate"])
-                cgst_amt_col = find_col(["cgst", "inr"])
-                sgst_rate_col = find_col(["sgst", "rate"])
-                sgst_amt_col = find_col(["sgst", "inr"])
-                total_col = find_col(["total"])
-
-                sl = 1
-                for _, row in df.iterrows():
-                    part = str(row[part_col]).lower()
-
-                    if "total value" in part:
-                        net_value = safe_float(row[net_col])
-                        total_value = safe_float(row[total_col])
-                        tax_value = round(total_value - net_value, 2)
-                        continue
-
-                    if "item(s) total" in part:
-                        continue
-
-                    if part.strip():
-                        line_items.append(
-                            {
-                                "Sl.No": sl,
-                                "Description": row[part_col],
-                                "UnitPrice": safe_float(row[gross_col]),
-                                "Discount": safe_float(row[disc_col]),
-                                "Qty": 1,
-                                "NetAmount": safe_float(row[net_col]),
-                                "TaxRate": f"{row[cgst_rate_col]} + {row[sgst_rate_col]}",
-                                "TaxType": "CGST+SGST",
-                                "TaxAmount": (
-                                    safe_float(row[cgst_amt_col])
-                                    + safe_float(row[sgst_amt_col])
-                                ),
-                                "TotalAmount": safe_float(row[total_col]),
-                            }
-                        )
-                        sl += 1
+                gross_col = safe_float_column(find_col(["gross"]))
+                disc_col = safe_float_column(find_col(["discount"]))
+                net_col = safe_float_column(find_col(["net"]))
+                cgst_rate_col = find_col(["cgst", "rate"]).astype(str)
+                cgst_amt_col = safe_float_column(find_col(["cgst", "inr"]))
+                sgst_rate_col = find_col(["sgst", "rate"]).astype(str)
+                sgst_amt_col = safe_float_column(find_col(["sgst", "inr"]))
+                total_col = safe_float_column(find_col(["total"]))
+
+                part = part_col.astype(str).str.lower()
+                is_total = part.str.contains("total value", regex=False)
+                is_item = (
+                    ~is_total
+                    & ~part.str.contains("item(s) total", regex=False)
+                    & part.str.strip().ne("")
+                )
+
+                if is_total.any():
+                    net_value = float(net_col[is_total].iloc[-1])
+                    total_value = float(total_col[is_total].iloc[-1])
+                    tax_value = round(total_value - net_value, 2)
+
+                n = int(is_item.sum())
+                line_items = {
+                    "Sl.No": range(1, n + 1),
+                    "Description": part_col[is_item].tolist(),
+                    "UnitPrice": gross_col[is_item].tolist(),
+                    "Discount": disc_col[is_item].tolist(),
+                    "Qty": [1] * n,
+                    "NetAmount": net_col[is_item].tolist(),
+                    "TaxRate": (cgst_rate_col + " + " + sgst_rate_col)[is_item].tolist(),
+                    "TaxType": ["CGST+SGST"] * n,
+                    "TaxAmount": (cgst_amt_col + sgst_amt_col)[is_item].tolist(),
+                    "TotalAmount": total_col[is_item].tolist(),
+                }
 
                 return pd.DataFrame(line_items), net_value, tax_value, total_value
 
@@ -1,6 +1,9 @@
 # main_production_v2.py
+import argparse
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
 import pdfplumber
 import pandas as pd
 from pathlib import Path
@@ -18,35 +21,82 @@ DEBUG_DIR = os.path.join(OUTPUT_DIR, "debug_clusters")
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(DEBUG_DIR, exist_ok=True)
+# =====================================================
+# OUTPUT TEMPLATE
+# =====================================================
+
+@cache
+def _template_fields() -> tuple:
+    """Field names from the output template, read once per process"""
+    return tuple(pd.read_excel(TEMPLATE_PATH)["Field"])
+
+
+@cache
+def _excel_engine() -> str:
+    """xlsxwriter when installed (optional, much faster writes), else openpyxl"""
+    try:
+        import xlsxwriter  # noqa: F401
+    except ImportError:
+        return "openpyxl"
+    return "xlsxwriter"
 
 # =====================================================
 # BRAND DETECTION
 # =====================================================
 
+# (brand, keywords): a brand matches when all of an entry's keywords occur.
+# Order matters! Most specific first.
+BRAND_KEYS = tuple(
+    (brand, frozenset(keys))
+    for brand, keys in (
+        ("blinkit", ("blinkit",)),
+        ("blinkit", ("zomato hyperpure",)),
+        ("flipkart", ("flipkart",)),
+        ("flipkart", ("shopler estore",)),
+        ("amazon", ("amazon",)),
+        ("instamart", ("instamart",)),
+        ("instamart", ("b2c",)),
+        ("instamart", ("swiggy", "invoice")),
+        ("zomato", ("zomato", "restaurant")),
+        ("zomato", ("ethernal", "restaurant")),
+    )
+)
+
 def detect_brand(text_lower: str) -> str:
     """
     Auto-detect brand from PDF text.
-    Order matters! Most specific first.
+    Returns the first BRAND_KEYS entry whose keywords all occur, else None.
     """
-    if "blinkit" in text_lower or ("zomato hyperpure" in text_lower):
-        return "blinkit"
-    elif "flipkart" in text_lower or "shopler estore" in text_lower:
-        return "flipkart"
-    elif "amazon" in text_lower or "amazon seller" in text_lower:
-        return "amazon"
-    elif "instamart" in text_lower or "b2c" in text_lower or ("swiggy" in text_lower and "invoice" in text_lower):
-        return "instamart"
-    elif ("zomato" in text_lower or "ethernal" in text_lower) and "restaurant" in text_lower:
-        return "zomato"
-    else:
-        return None
+    for brand, keys in BRAND_KEYS:
+        if all(k in text_lower for k in keys):
+            return brand
+    return None
+
+def detect_pdf_brand(pdf) -> tuple:
+    """
+    Detect brand from an opened PDF, reading page text only until a page
+    identifies it - usually page 1 alone. If no single page does, all pages
+    are tried together. The PDF is then handed to the extractor, and
+    pdfplumber keeps each page's parsed text, so pages read here are not
+    parsed again downstream.
+
+    Returns (brand or None, text of the pages read).
+    """
+    texts = []
+    for page in pdf.pages:
+        texts.append(page.extract_text() or "")
+        brand = detect_brand(texts[-1].lower())
+        if brand:
+            return brand, texts
+    # Entries with several keywords may have them on different pages
+    return detect_brand("\n".join(texts).lower()), texts
 
 # =====================================================
 # FACTORY PATTERN - GET APPROPRIATE EXTRACTOR
 # =====================================================
 
-def get_extractor(pdf_path: str, brand: str):
-    """Factory: return appropriate extractor instance"""
+def get_extractor(pdf_path: str, brand: str, pdf=None, text=None):
+    """Factory: return appropriate extractor instance (reusing pdf/text if already read)"""
     extractors = {
         "amazon": AmazonExtractor,
         "flipkart": FlipkartExtractor,
@@ -57,44 +107,75 @@ def get_extractor(pdf_path: str, brand: str):
     extractor_class = extractors.get(brand)
     if not extractor_class:
         return None
-    return extractor_class(pdf_path)
+    return extractor_class(pdf_path, pdf=pdf, text=text)
 
 # =====================================================
 # MAIN PROCESSOR
 # =====================================================
 
-def process_invoice(pdf_path: str, output_dir: str) -> str:
+def extract_invoice(pdf_path: str, log=print) -> tuple:
     """
-    Main router: detect brand, create extractor, extract data, save to Excel
+    Detect brand, create extractor and extract data.
+    Returns (brand, header_dict, items_df), or None if the PDF failed.
+    Progress lines go to log (print by default).
     """
     filename = os.path.basename(pdf_path)
     
     try:
-        # 1. Extract text for brand detection
+        # Open once: brand detection and extraction share the parsed pages
         with pdfplumber.open(pdf_path) as pdf:
-            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-            text_lower = text.lower()
-        
-        # 2. Detect brand
-        brand = detect_brand(text_lower)
-        print(f"\n▶ {filename}")
+            # 1-2. Detect brand from the first page(s) that name it
+            brand, texts = detect_pdf_brand(pdf)
+            # Full text only when detection had to read every page
+            text = "\n".join(texts) if len(texts) == len(pdf.pages) else None
+            log(f"\n▶ {filename}")
+            
+            if not brand:
+                log(f" ⚠️ Brand not recognized")
+                return None
+            
+            # 3. Get appropriate extractor
+            extractor = get_extractor(pdf_path, brand, pdf=pdf, text=text)
+            if not extractor:
+                log(f" ❌ No extractor for {brand}")
+                return None
+            
+            # 4. Extract data (polymorphic call)
+            header_dict, items_df = extractor.extract(log=log)
         
-        if not brand:
-            print(f" ⚠️ Brand not recognized")
-            return None
-        
-        # 3. Get appropriate extractor
-        extractor = get_extractor(pdf_path, brand)
-        if not extractor:
-            print(f" ❌ No extractor for {brand}")
-            return None
+        # Print brand emoji
+        emoji_map = {
+            "amazon": "🛍️",
+            "flipkart": "🛒",
+            "zomato": "🍽️",
+            "blinkit": "⚡",
+            "instamart": "🏪"
+        }
+        log(f" {emoji_map.get(brand, '📦')} Detected: {brand.upper()}")
         
-        # 4. Extract data (polymorphic call)
-        header_dict, items_df = extractor.extract()
+        return brand, header_dict, items_df
         
-        # 5. Load template
-        template_df = pd.read_excel(TEMPLATE_PATH)
-        template_df["Value"] = template_df["Field"].map(header_dict).fillna("")
+    except Exception as e:
+        log(f" ❌ Error: {str(e)}")
+        import traceback
+        log(traceback.format_exc().rstrip())
+        return None
+
+
+def fill_template(header_dict: dict) -> list:
+    """Header values in template field order, "" where missing"""
+    values = pd.Series([header_dict.get(f) for f in _template_fields()], dtype=object)
+    return values.fillna("").tolist()
+
+
+def save_invoice(pdf_path: str, brand: str, header_dict: dict, items_df: pd.DataFrame,
+                 output_dir: str, log=print) -> str:
+    """Save one invoice to its own workbook; returns its path, or None on failure"""
+    try:
+        # 5. Fill template fields
+        template_df = pd.DataFrame(
+            {"Field": _template_fields(), "Value": fill_template(header_dict)}
+        )
         
         # 6. Save Excel output
         out_path = os.path.join(
@@ -102,35 +183,113 @@ def process_invoice(pdf_path: str, output_dir: str) -> str:
             os.path.basename(pdf_path).replace(".pdf", f"_{brand}_output.xlsx")
         )
         
-        with pd.ExcelWriter(out_path, engine="openpyxl") as writer:
+        # No constant_memory: pandas writes column by column, which that mode drops
+        with pd.ExcelWriter(out_path, engine=_excel_engine()) as writer:
             template_df.to_excel(writer, index=False, sheet_name="Invoice_Fields")
             if not items_df.empty:
                 items_df.to_excel(writer, index=False, sheet_name="Line_Items")
         
-        # Print brand emoji
-        emoji_map = {
-            "amazon": "🛍️",
-            "flipkart": "🛒",
-            "zomato": "🍽️",
-            "blinkit": "⚡",
-            "instamart": "🏪"
-        }
-        print(f" {emoji_map.get(brand, '📦')} Detected: {brand.upper()}")
-        print(f" ✅ Saved: {os.path.basename(out_path)}")
+        log(f" ✅ Saved: {os.path.basename(out_path)}")
         
         return out_path
         
     except Exception as e:
-        print(f" ❌ Error: {str(e)}")
+        log(f" ❌ Error: {str(e)}")
         import traceback
-        traceback.print_exc()
+        log(traceback.format_exc().rstrip())
+        return None
+
+
+def process_invoice(pdf_path: str, output_dir: str, log=print) -> str:
+    """
+    Main router: detect brand, create extractor, extract data, save to Excel
+    """
+    result = extract_invoice(pdf_path, log)
+    if not result:
         return None
+    return save_invoice(pdf_path, *result, output_dir, log)
+
+
+def _standard_columns(items_df: pd.DataFrame) -> pd.DataFrame:
+    """Line items with whitespace dropped from column names ('Unit\\nPrice' -> 'UnitPrice')"""
+    return items_df.rename(columns=lambda c: "".join(str(c).split()))
+
+
+def save_combined(records: list, output_dir: str, log=print) -> str:
+    """
+    Write every invoice to one workbook: a row of template fields per
+    invoice, and all line items tagged with their source file.
+    records holds (filename, brand, header_dict, items_df) tuples.
+    Returns the workbook path, or None on failure.
+    """
+    try:
+        fields = list(_template_fields())
+        headers = pd.DataFrame(
+            [[name, brand, *fill_template(header)] for name, brand, header, _ in records],
+            columns=["File", "Brand", *fields],
+        )
+        # Amazon keeps the PDF's own headers ('Sl.\nNo', ...); align them with
+        # the other brands' Sl.No/UnitPrice/... so rows share one set of columns
+        items = [
+            _standard_columns(items_df).assign(File=name)
+            for name, _, _, items_df in records
+            if not items_df.empty
+        ]
+        
+        out_path = os.path.join(output_dir, "invoices_output.xlsx")
+        with pd.ExcelWriter(out_path, engine=_excel_engine()) as writer:
+            headers.to_excel(writer, index=False, sheet_name="Invoice_Fields")
+            if items:
+                line_items = pd.concat(items, ignore_index=True)
+                line_items = line_items[["File", *line_items.columns.drop("File")]]
+                line_items.to_excel(writer, index=False, sheet_name="Line_Items")
+        
+        log(f"\n✅ Saved: {os.path.basename(out_path)}")
+        
+        return out_path
+        
+    except Exception as e:
+        log(f"\n❌ Error saving combined workbook: {str(e)}")
+        import traceback
+        log(traceback.format_exc().rstrip())
+        return None
+
+# =====================================================
+# PARALLEL BATCH
+# =====================================================
+
+def _process_one(job: tuple) -> tuple:
+    """
+    Worker: extract one PDF, and save it to its own workbook if per_file.
+    Returns (brand or None, (header_dict, items_df) for the combined
+    workbook or None, progress lines for the parent to print).
+    """
+    pdf_path, per_file = job
+    lines = []
+    result = extract_invoice(pdf_path, log=lines.append)
+    if not result:
+        return None, None, lines
+    brand, header_dict, items_df = result
+    if per_file:
+        out_path = save_invoice(
+            pdf_path, brand, header_dict, items_df, OUTPUT_DIR, log=lines.append
+        )
+        return (brand if out_path else None), None, lines
+    return brand, (header_dict, items_df), lines
 
 # =====================================================
 # MAIN EXECUTION
 # =====================================================
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract invoice PDFs to Excel")
+    parser.add_argument(
+        "--per-file",
+        action="store_true",
+        help="write one workbook per invoice instead of a single combined workbook",
+    )
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("UNIVERSAL INVOICE EXTRACTOR - OOP PRODUCTION V2")
     print("=" * 60)
@@ -150,17 +309,28 @@ if __name__ == "__main__":
     print(f"📂 Output: {OUTPUT_DIR}")
     print(f"📝 Debug: {DEBUG_DIR}\n")
     
-    # Process each PDF
+    # Process PDFs in parallel - each invoice is independent
     results = {"amazon": 0, "flipkart": 0, "zomato": 0, "blinkit": 0, "instamart": 0, "failed": 0}
+    records = []
+    
+    with ProcessPoolExecutor() as executor:
+        paths = [str(p) for p in sorted(pdf_files)]
+        jobs = [(path, args.per_file) for path in paths]
+        outcomes = executor.map(_process_one, jobs, chunksize=4)
+        for path, (brand, record, lines) in zip(paths, outcomes):
+            # Workers hand their output back so invoices don't interleave
+            print("\n".join(lines))
+            if not brand:
+                results["failed"] += 1
+                continue
+            results[brand] += 1
+            if record:
+                records.append((os.path.basename(path), brand, *record))
     
-    for pdf_file in sorted(pdf_files):
-        out_path = process_invoice(str(pdf_file), OUTPUT_DIR)
-        if out_path:
-            for brand in results.keys():
-                if f"_{brand}_" in out_path:
-                    results[brand] += 1
-                    break
-        else:
+    if records and not save_combined(records, OUTPUT_DIR):
+        # Nothing from this batch was saved
+        for _, brand, _, _ in records:
+            results[brand] -= 1
             results["failed"] += 1
     
     # Summary
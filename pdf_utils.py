@@ -0,0 +1,56 @@
+import os
+from collections import OrderedDict
+from contextlib import nullcontext
+from functools import wraps
+import pdfplumber
+
+
+def open_pdf(pdf_or_path):
+    """Open a PDF path, or pass an already-opened pdfplumber PDF through.
+
+    Use as a context manager. Documents that were passed in open are left
+    open for their owner to close; paths are opened and closed here.
+    """
+    if hasattr(pdf_or_path, "pages"):
+        return nullcontext(pdf_or_path)
+    return pdfplumber.open(pdf_or_path)
+
+
+def _file_key(pdf_or_path):
+    """(path, mtime) for a PDF path or opened PDF, None if it has no file"""
+    path = getattr(pdf_or_path, "path", pdf_or_path)
+    try:
+        path = os.fspath(path)
+        return path, os.path.getmtime(path)
+    except (TypeError, OSError):
+        return None
+
+
+def cache_per_file(maxsize=64):
+    """LRU-cache a function of one PDF (path or opened PDF) per file.
+
+    Results are keyed on the file's path and modification time, so a path
+    and an opened document of the same file share an entry and an edited
+    file is re-read. On a miss the function is called with the original
+    argument, so an already-opened document is not reopened.
+    """
+    def decorator(func):
+        cache = OrderedDict()
+
+        @wraps(func)
+        def wrapper(pdf_or_path):
+            key = _file_key(pdf_or_path)
+            if key is None:
+                return func(pdf_or_path)
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+            result = cache[key] = func(pdf_or_path)
+            if len(cache) > maxsize:
+                cache.popitem(last=False)
+            return result
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator